@@ -1,14 +1,40 @@
 """
 Budget Reporter - Actual Budget 智能周报系统
 """
+import importlib
+from typing import TYPE_CHECKING
 
 __version__ = "0.1.0"
 
-# from .reporter import BudgetReporter
-from .actual_client import ActualClient
-from .analyzer import FinanceAnalyzer, WeeklyStats, Anomaly
-from .gemini_summarizer import GeminiSummarizer
-from .discord_notifier import DiscordNotifier
+# 按需导入：`import src` 或 `python -m src.reporter` 时不会提前加载
+# actualpy / google-genai 等重量级依赖
+_EXPORTS = {
+    "BudgetReporter": ".reporter",
+    "ActualClient": ".actual_client",
+    "FinanceAnalyzer": ".analyzer",
+    "WeeklyStats": ".analyzer",
+    "Anomaly": ".analyzer",
+    "SimplifiedTxn": ".analyzer",
+    "GeminiSummarizer": ".gemini_summarizer",
+    "DiscordNotifier": ".discord_notifier",
+}
+
+if TYPE_CHECKING:
+    from .reporter import BudgetReporter
+    from .actual_client import ActualClient
+    from .analyzer import FinanceAnalyzer, WeeklyStats, Anomaly, SimplifiedTxn
+    from .gemini_summarizer import GeminiSummarizer
+    from .discord_notifier import DiscordNotifier
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
 
 __all__ = [
     "BudgetReporter",
@@ -16,6 +42,7 @@ __all__ = [
     "FinanceAnalyzer",
     "WeeklyStats",
     "Anomaly",
+    "SimplifiedTxn",
     "GeminiSummarizer",
     "DiscordNotifier",
 ]
@@ -1,11 +1,13 @@
 import os
-import json
-from datetime import datetime, date
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 
+from sqlalchemy import and_, select
+from sqlalchemy.orm import aliased
+from urllib3.util.retry import Retry
 from actual import Actual
-from actual.database import Transactions, Categories, Accounts
+from actual.database import Transactions, Categories, Accounts, Payees
 
 @dataclass
 class Transaction:
@@ -30,6 +32,9 @@ class Category:
 class ActualClient:
     """连接 Actual Budget Server 的客户端 (using actualpy)"""
 
+    # 分类/账户在一次运行内几乎不变，缓存有效期 (秒)
+    CACHE_TTL = 300
+
     def __init__(self, server_url: str, password: str, budget_id: str):
         self.server_url = server_url.rstrip('/')
         self.password = password
@@ -43,10 +48,21 @@ class ActualClient:
             file=self.budget_id,
             cert=False if not self.verify_ssl else None
         )
+        # actualpy 在构造时已用自身的 requests.Session 完成登录，其默认 adapter
+        # 已保持 keep-alive 连接；这里只给该 adapter 加上重试，不替换它，
+        # 以免丢弃已建立的连接。登录请求发生在此之前，不在重试范围内
+        self.actual._requests_session.get_adapter(self.server_url).max_retries = Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=[429, 500, 502, 503, 504]
+        )
         self._session_active = False
+        self._categories_cache: Optional[Tuple[float, List[Category]]] = None
+        self._accounts_cache: Optional[Tuple[float, List[Dict]]] = None
 
     def login(self) -> bool:
         """Initialize connection and download budget"""
+        self._invalidate_cache()
         try:
             self.actual.__enter__()
             self._session_active = True
@@ -56,11 +72,25 @@ class ActualClient:
             return False
 
     def close(self):
+        self._invalidate_cache()
         if self._session_active:
             self.actual.__exit__(None, None, None)
             self._session_active = False
+        self.actual._requests_session.close()
+
+    def _invalidate_cache(self):
+        self._categories_cache = None
+        self._accounts_cache = None
 
-    def __del__(self):
+    def _is_fresh(self, cache: Optional[Tuple[float, Any]]) -> bool:
+        return cache is not None and time.monotonic() - cache[0] < self.CACHE_TTL
+
+    def __enter__(self) -> "ActualClient":
+        if not self.login():
+            raise RuntimeError("Failed to login to Actual Budget")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
     def get_transactions(self, start_date: str, end_date: str) -> List[Transaction]:
@@ -70,45 +100,70 @@ class ActualClient:
         end_int = int(end_date.replace('-', ''))
 
         session = self.actual.session
-        
-        # Query transactions
-        db_txns = session.query(Transactions).filter(
-            Transactions.date >= start_int,
-            Transactions.date <= end_int,
-            Transactions.is_parent == 0,
-            Transactions.tombstone == 0
-        ).all()
+
+        # 只查询需要的列，payee/category/account/transfer 通过 LEFT JOIN 一次取回，
+        # 不构造 ORM 对象 (join 条件与 actualpy 的 relationship 定义一致)
+        transfer = aliased(Transactions)
+        transfer_account = aliased(Accounts)
+        stmt = (
+            select(
+                Transactions.id,
+                Transactions.date,
+                Transactions.amount,
+                Transactions.notes,
+                Transactions.transferred_id,
+                Payees.name,
+                Categories.name,
+                Accounts.name,
+                transfer.id,
+                transfer_account.name
+            )
+            .outerjoin(Payees, and_(Transactions.payee_id == Payees.id, Payees.tombstone == 0))
+            .outerjoin(Categories, and_(Transactions.category_id == Categories.id, Categories.tombstone == 0))
+            .outerjoin(Accounts, Transactions.acct == Accounts.id)
+            .outerjoin(transfer, and_(Transactions.transferred_id == transfer.id, transfer.tombstone == 0))
+            .outerjoin(transfer_account, transfer.acct == transfer_account.id)
+            .where(
+                Transactions.date >= start_int,
+                Transactions.date <= end_int,
+                Transactions.is_parent == 0,
+                Transactions.tombstone == 0
+            )
+        )
 
         transactions = []
-        for t in db_txns:
+        for (
+            txn_id, date_int, amount, notes, transferred_id,
+            payee_name, category_name, account_name,
+            transfer_id, transfer_account_name
+        ) in session.execute(stmt):
             # Payee might be None for transfers or if deleted
-            payee_name = t.payee.name if t.payee else ""
-            if not payee_name and t.transfer:
-                 # Check if it's a transfer
-                 payee_name = f"Transfer: {t.transfer.account.name}" if t.transfer.account else "Transfer"
-
-            category_name = t.category.name if t.category else ""
-            account_name = t.account.name if t.account else ""
-            
+            if not payee_name and transfer_id is not None:
+                # Check if it's a transfer
+                payee_name = f"Transfer: {transfer_account_name}" if transfer_account_name else "Transfer"
+
             # Date conversion int -> str YYYY-MM-DD
-            date_str = str(t.date)
+            date_str = str(date_int)
             date_fmt = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
 
             transactions.append(Transaction(
-                id=t.id,
+                id=txn_id,
                 date=date_fmt,
-                amount=t.amount,
-                payee=payee_name,
-                category=category_name,
-                account=account_name,
-                notes=t.notes,
-                is_transfer=t.transferred_id is not None
+                amount=amount,
+                payee=payee_name or "",
+                category=category_name or "",
+                account=account_name or "",
+                notes=notes,
+                is_transfer=transferred_id is not None
             ))
 
         return transactions
 
     def get_categories(self) -> List[Category]:
         """获取所有分类"""
+        if self._is_fresh(self._categories_cache):
+            return self._categories_cache[1]
+
         session = self.actual.session
         db_cats = session.query(Categories).filter(Categories.tombstone == 0).all()
         
@@ -121,10 +176,14 @@ class ActualClient:
                 group=group_name,
                 is_income=c.is_income == 1
             ))
+        self._categories_cache = (time.monotonic(), categories)
         return categories
 
     def get_accounts(self) -> List[Dict]:
         """获取账户列表"""
+        if self._is_fresh(self._accounts_cache):
+            return self._accounts_cache[1]
+
         session = self.actual.session
         db_accts = session.query(Accounts).filter(Accounts.tombstone == 0).all()
         
@@ -136,4 +195,5 @@ class ActualClient:
                 "offbudget": a.offbudget == 1,
                 "closed": a.closed == 1
             })
+        self._accounts_cache = (time.monotonic(), accounts)
         return accounts
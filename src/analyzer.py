@@ -1,12 +1,54 @@
 """
 财务分析引擎 - 纯规则计算，零 LLM Token 消耗
 """
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Tuple, Optional
+import heapq
+import re
+from operator import attrgetter, itemgetter
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Dict, Any, Tuple, Optional, NamedTuple, Mapping
 from dataclasses import dataclass
 from collections import defaultdict
 
-from .actual_client import Transaction
+if TYPE_CHECKING:
+    # 只用于类型标注，避免导入分析器时加载 actualpy
+    from .actual_client import Transaction
+
+
+def cents_to_dollars(cents: int) -> int:
+    """分 -> 整数美元 (四舍五入)，全程整数运算，避免浮点误差"""
+    dollars, remainder = divmod(abs(cents), 100)
+    if remainder >= 50:
+        dollars += 1
+    return -dollars if cents < 0 else dollars
+
+
+def category_spikes(
+    current: Dict[str, int],
+    previous: Dict[str, int],
+    threshold: float
+) -> List[Tuple[str, int, int]]:
+    """按分类与上周内连接，筛出环比增长超过 threshold 的分类
+
+    Returns:
+        [(category, current_cents, previous_cents), ...]，保持本周分类顺序
+    """
+    factor = 1 + threshold
+    return [
+        (cat, amount, previous[cat])
+        for cat, amount in current.items()
+        if previous.get(cat, 0) > 0 and amount > previous[cat] * factor
+    ]
+
+
+class SimplifiedTxn(NamedTuple):
+    """简化的交易记录，用于 AI 分析 (金额单位: 美元)"""
+    date: str
+    payee: str
+    amount: float
+    abs_amount: float
+    category: str
+    notes: Optional[str]
+    amount_cents: int  # 原始金额 (分)，展示整数美元时用 cents_to_dollars 取整
 
 
 @dataclass
@@ -19,11 +61,11 @@ class WeeklyStats:
     net_change: int  # cents
     category_breakdown: Dict[str, int]  # category -> cents
     top_expenses: List[Tuple[str, int]]  # [(category, amount), ...]
-    top_transactions: List[Dict]  # Top N transactions by amount (Expenses)
-    top_income_transactions: List[Dict]  # Top N income transactions
+    top_transactions: List[SimplifiedTxn]  # Top N transactions by amount (Expenses)
+    top_income_transactions: List[SimplifiedTxn]  # Top N income transactions
     uncategorized_count: int
     large_transactions: List[Dict]  # > $100 的交易
-    simplified_transactions: List[Dict] # 简化的交易列表，用于 AI 分析
+    simplified_transactions: List[SimplifiedTxn] # 简化的交易列表 (按金额绝对值降序, Top N)，用于 AI 分析
     daily_average: int
 
 
@@ -45,7 +87,13 @@ class FinanceAnalyzer:
     LARGE_TRANSACTION_THRESHOLD = 10000  # $100 (cents)
     UNCATEGORIZED_THRESHOLD = 5  # 未分类交易 >5 笔
 
-    def __init__(self, transactions: List[Transaction]):
+    # 提供给 AI 分析的交易条数上限 (按金额绝对值取 Top N)
+    SIMPLIFIED_TXN_LIMIT = 30
+
+    # 手动转账关键字 (payee / category 中出现即视为转账)，类加载时编译一次
+    _TRANSFER_RE = re.compile(r"transfer", re.IGNORECASE)
+
+    def __init__(self, transactions: List["Transaction"]):
         self.transactions = transactions
 
     def calculate_weekly_stats(self) -> WeeklyStats:
@@ -54,26 +102,80 @@ class FinanceAnalyzer:
         # 2. 过滤掉未分类但包含 "Transfer" 关键字的交易
         # 3. 过滤掉 Category 为 None 或者 "Transfer" 的交易
         
-        valid_txns = []
+        total_income = 0
+        total_expense = 0
+        # 分类统计
+        category_totals = defaultdict(int)
+        uncategorized_count = 0
+        # 大额交易（>$100）
+        large_transactions = []
+        # 准备交易列表给 AI；支出/收入视图共享同一批记录，不再二次筛选
+        simplified_transactions = []
+        expense_txns = []
+        income_txns = []
+        # 日期范围（YYYY-MM-DD 字符串可直接按字典序比较，无需逐条解析）
+        week_start = week_end = None
+
+        # 单次遍历：过滤转账的同时更新所有累加器
         for t in self.transactions:
             if t.is_transfer:
                 continue
             
-            # Check for manual transfers
-            payee_lower = (t.payee or "").lower()
-            category_lower = (t.category or "").lower()
-            notes_lower = (t.notes or "").lower()
-            
-            # Keywords often used in transfers
-            if "transfer" in payee_lower or "transfer" in category_lower:
+            # Check for manual transfers (keywords often used in transfers)
+            # 短路判断：payee 命中时不再检查 category
+            if (
+                self._TRANSFER_RE.search(t.payee or "")
+                or self._TRANSFER_RE.search(t.category or "")
+            ):
                 continue
             
             # If notes mention "transfer" and amount is large round number, might still be transfer?
             # Let's be conservative and just check Payee/Category for now.
 
-            valid_txns.append(t)
+            if week_start is None or t.date < week_start:
+                week_start = t.date
+            if week_end is None or t.date > week_end:
+                week_end = t.date
+
+            abs_cents = -t.amount if t.amount < 0 else t.amount
+
+            # 添加到简化列表
+            simplified = SimplifiedTxn(
+                date=t.date,
+                payee=t.payee,
+                amount=t.amount / 100,  # 转换为美元
+                abs_amount=abs_cents / 100,  # 预先算好，排序时不再重复 abs()
+                category=t.category or "未分类",
+                notes=t.notes,
+                amount_cents=t.amount
+            )
+            simplified_transactions.append(simplified)
 
-        if not valid_txns:
+            # 收入和支出（amount: 正数=收入，负数=支出）
+            if t.amount < 0:  # 只统计支出
+                total_expense += abs_cents
+                if not t.category or t.category == "Uncategorized":
+                    uncategorized_count += 1
+                    cat_name = "未分类"
+                else:
+                    cat_name = t.category
+                category_totals[cat_name] += abs_cents
+                expense_txns.append(simplified)
+            elif t.amount > 0:
+                total_income += t.amount
+                income_txns.append(simplified)
+
+            if abs_cents >= self.LARGE_TRANSACTION_THRESHOLD:
+                large_transactions.append({
+                    "date": t.date,
+                    "payee": t.payee,
+                    "amount": abs_cents / 100,  # 转换为美元
+                    "amount_cents": abs_cents,
+                    "category": t.category or "未分类",
+                    "notes": t.notes
+                })
+
+        if week_start is None:
             # 没有交易，返回空统计
             return WeeklyStats(
                 week_start="",
@@ -91,86 +193,41 @@ class FinanceAnalyzer:
                 daily_average=0
             )
 
-        # 日期范围
-        dates = [datetime.strptime(t.date, "%Y-%m-%d") for t in valid_txns]
-        week_start = min(dates).strftime("%Y-%m-%d")
-        week_end = max(dates).strftime("%Y-%m-%d")
-
-        # 收入和支出（amount: 正数=收入，负数=支出）
-        total_income = sum(t.amount for t in valid_txns if t.amount > 0)
-        total_expense = abs(sum(t.amount for t in valid_txns if t.amount < 0))
         net_change = total_income - total_expense
 
-        # 分类统计
-        category_totals = defaultdict(int)
-        uncategorized_count = 0
-        
-        # 准备交易列表给 AI
-        simplified_transactions = []
-
-        for t in valid_txns:
-            if t.amount < 0:  # 只统计支出
-                if not t.category or t.category == "Uncategorized":
-                    uncategorized_count += 1
-                    cat_name = "未分类"
-                else:
-                    cat_name = t.category
-                category_totals[cat_name] += abs(t.amount)
-            
-            # 添加到简化列表
-            simplified_transactions.append({
-                "date": t.date,
-                "payee": t.payee,
-                "amount": t.amount / 100, # 转换为美元
-                "category": t.category or "未分类",
-                "notes": t.notes
-            })
-
-        # Top 支出分类
-        sorted_categories = sorted(
-            category_totals.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )
-        top_expenses = sorted_categories[:5]
-
-        # 大额交易（>$100）
-        large_transactions = []
-        for t in valid_txns:
-            if abs(t.amount) >= self.LARGE_TRANSACTION_THRESHOLD:
-                large_transactions.append({
-                    "date": t.date,
-                    "payee": t.payee,
-                    "amount": abs(t.amount) / 100,  # 转换为美元
-                    "category": t.category or "未分类",
-                    "notes": t.notes
-                })
+        # Top 支出分类（只需前 5，用堆选取代全量排序）
+        top_expenses = heapq.nlargest(5, category_totals.items(), key=itemgetter(1))
 
         # 日均支出
-        days_count = (max(dates) - min(dates)).days + 1
+        days_count = (
+            datetime.strptime(week_end, "%Y-%m-%d") - datetime.strptime(week_start, "%Y-%m-%d")
+        ).days + 1
         daily_average = total_expense // max(days_count, 1)
 
-        # Top Transactions (All expenses > $20, or at least Top 5)
-        all_expenses = sorted(
-            [t for t in simplified_transactions if t['amount'] < 0],
-            key=lambda x: abs(x['amount']),
+        # Top Transactions (All expenses > $20, or at least Top 5)，abs_amount 单位为美元，只对筛选后的子集排序
+        by_abs_amount = attrgetter('abs_amount')
+        top_transactions = sorted(
+            [t for t in expense_txns if t.abs_amount > 20],
+            key=by_abs_amount,
             reverse=True
         )
         
-        # Filter > $20 (2000 cents is $20, but amount is already in dollars/float in simplified_transactions? 
-        # Wait, simplified_transactions has 'amount' as float (dollars).
-        # So check abs(amount) > 20.
-        top_transactions = [t for t in all_expenses if abs(t['amount']) > 20]
-        
         if len(top_transactions) < 5:
-            top_transactions = all_expenses[:5]
+            top_transactions = heapq.nlargest(5, expense_txns, key=by_abs_amount)
 
         # Top 5 Income Transactions
-        top_income_transactions = sorted(
-            [t for t in simplified_transactions if t['amount'] > 0],
-            key=lambda x: abs(x['amount']),
-            reverse=True
-        )[:5]
+        top_income_transactions = heapq.nlargest(
+            5,
+            income_txns,
+            key=by_abs_amount
+        )
+
+        # 只保留金额最大的 N 笔给 AI，降序排列
+        simplified_transactions = heapq.nlargest(
+            self.SIMPLIFIED_TXN_LIMIT,
+            simplified_transactions,
+            key=by_abs_amount
+        )
 
         return WeeklyStats(
             week_start=week_start,
@@ -195,6 +252,14 @@ class FinanceAnalyzer:
         previous_stats: Optional[WeeklyStats] = None
     ) -> List[Anomaly]:
         """检测异常，纯规则判断"""
+        anomalies = self._detect_absolute(current_stats)
+        # 是否有上周数据只在这里判断一次
+        if previous_stats:
+            anomalies.extend(self._detect_comparative(current_stats, previous_stats))
+        return anomalies
+
+    def _detect_absolute(self, current_stats: WeeklyStats) -> List[Anomaly]:
+        """只依赖本周数据的异常"""
         anomalies = []
 
         # 1. 未分类交易过多
@@ -215,58 +280,69 @@ class FinanceAnalyzer:
                 data=txn
             ))
 
-        # 3. 环比分析（需要上周数据）
-        if previous_stats:
-            # 总支出的环比变化
-            if previous_stats.total_expense > 0:
-                change_ratio = (
-                    current_stats.total_expense - previous_stats.total_expense
-                ) / previous_stats.total_expense
-
-                if change_ratio > self.SPIKE_THRESHOLD:
-                    anomalies.append(Anomaly(
-                        type="spike",
-                        severity="high",
-                        description=f"本周支出环比增长 {change_ratio*100:.0f}%",
-                        data={
-                            "ratio": change_ratio,
-                            "current": current_stats.total_expense,
-                            "previous": previous_stats.total_expense
-                        }
-                    ))
-                elif change_ratio < self.DROP_THRESHOLD:
-                    anomalies.append(Anomaly(
-                        type="drop",
-                        severity="low",
-                        description=f"本周支出环比下降 {abs(change_ratio)*100:.0f}%",
-                        data={
-                            "ratio": change_ratio,
-                            "current": current_stats.total_expense,
-                            "previous": previous_stats.total_expense
-                        }
-                    ))
-
-            # 分类级别的环比变化
-            for cat, amount in current_stats.category_breakdown.items():
-                prev_amount = previous_stats.category_breakdown.get(cat, 0)
-                if prev_amount > 0 and amount > prev_amount * (1 + self.SPIKE_THRESHOLD):
-                    anomalies.append(Anomaly(
-                        type="category_spike",
-                        severity="medium",
-                        description=f"{cat} 支出激增: ${amount/100:.0f} vs 上周 ${prev_amount/100:.0f}",
-                        data={
-                            "category": cat,
-                            "current": amount,
-                            "previous": prev_amount
-                        }
-                    ))
+        return anomalies
+
+    def _detect_comparative(
+        self,
+        current_stats: WeeklyStats,
+        previous_stats: WeeklyStats
+    ) -> List[Anomaly]:
+        """3. 环比分析（需要上周数据）"""
+        anomalies = []
+
+        # 总支出的环比变化
+        if previous_stats.total_expense > 0:
+            change_ratio = (
+                current_stats.total_expense - previous_stats.total_expense
+            ) / previous_stats.total_expense
+
+            if change_ratio > self.SPIKE_THRESHOLD:
+                anomalies.append(Anomaly(
+                    type="spike",
+                    severity="high",
+                    description=f"本周支出环比增长 {change_ratio*100:.0f}%",
+                    data={
+                        "ratio": change_ratio,
+                        "current": current_stats.total_expense,
+                        "previous": previous_stats.total_expense
+                    }
+                ))
+            elif change_ratio < self.DROP_THRESHOLD:
+                anomalies.append(Anomaly(
+                    type="drop",
+                    severity="low",
+                    description=f"本周支出环比下降 {abs(change_ratio)*100:.0f}%",
+                    data={
+                        "ratio": change_ratio,
+                        "current": current_stats.total_expense,
+                        "previous": previous_stats.total_expense
+                    }
+                ))
+
+        # 分类级别的环比变化
+        spikes = category_spikes(
+            current_stats.category_breakdown,
+            previous_stats.category_breakdown,
+            self.SPIKE_THRESHOLD
+        )
+        for cat, amount, prev_amount in spikes:
+            anomalies.append(Anomaly(
+                type="category_spike",
+                severity="medium",
+                description=f"{cat} 支出激增: ${cents_to_dollars(amount)} vs 上周 ${cents_to_dollars(prev_amount)}",
+                data={
+                    "category": cat,
+                    "current": amount,
+                    "previous": prev_amount
+                }
+            ))
 
         return anomalies
 
     def calculate_budget_health(
         self,
         current_stats: WeeklyStats,
-        monthly_budget: Optional[Dict[str, int]] = None
+        monthly_budget: Optional[Mapping[str, int]] = None
     ) -> Dict[str, Any]:
         """计算预算健康度"""
         if not monthly_budget:
@@ -0,0 +1,80 @@
+"""
+运行配置：一次性从环境变量 (及 .env) 读取
+"""
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Optional, Mapping
+
+from dotenv import load_dotenv
+
+# 字段 -> 环境变量名，用于报错提示
+_ENV_NAMES = {
+    "actual_url": "ACTUAL_SERVER_URL",
+    "actual_password": "ACTUAL_PASSWORD",
+    "budget_id": "ACTUAL_BUDGET_ID",
+    "discord_webhook": "DISCORD_WEBHOOK_URL",
+}
+
+
+class ConfigError(ValueError):
+    """必需的配置项缺失"""
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """预算周报的全部配置项"""
+    actual_url: Optional[str] = None
+    actual_password: Optional[str] = None
+    budget_id: Optional[str] = None
+    gemini_key: Optional[str] = None
+    discord_webhook: Optional[str] = None
+    monthly_budget: Optional[Mapping[str, int]] = None  # category -> cents (只读)
+    cache_dir: Optional[str] = None  # 未设置时不做磁盘缓存
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def from_env(cls) -> "Config":
+        """读取 .env 与环境变量，进程内只解析一次"""
+        load_dotenv()
+        return cls(
+            actual_url=os.getenv("ACTUAL_SERVER_URL"),
+            actual_password=os.getenv("ACTUAL_PASSWORD"),
+            budget_id=os.getenv("ACTUAL_BUDGET_ID"),
+            gemini_key=os.getenv("GOOGLE_GENERATIVE_AI_API_KEY"),
+            discord_webhook=os.getenv("DISCORD_WEBHOOK_URL"),
+            monthly_budget=_load_budget_config(os.getenv("MONTHLY_BUDGET", "")),
+            cache_dir=os.getenv("REPORT_CACHE_DIR") or None,
+        )
+
+    def validate(self, require_webhook: bool = False) -> "Config":
+        """检查必需配置，缺失时抛出 ConfigError，在任何网络请求之前调用"""
+        required = ["actual_url", "actual_password", "budget_id"]
+        if require_webhook:
+            required.append("discord_webhook")
+        missing = [_ENV_NAMES[name] for name in required if not getattr(self, name)]
+        if missing:
+            raise ConfigError(f"missing required settings: {', '.join(missing)}")
+        return self
+
+
+def _load_budget_config(budget_str: str) -> Optional[Mapping[str, int]]:
+    """解析月度预算配置，返回只读视图
+
+    格式: {"餐饮": 50000, "交通": 20000} (单位: cents)
+    """
+    if not budget_str:
+        return None
+    try:
+        budget = json.loads(budget_str)
+    except json.JSONDecodeError:
+        print("Warning: Invalid MONTHLY_BUDGET format")
+        return None
+    if not isinstance(budget, dict):
+        # [] / null 等合法 JSON 但不是对象，视为未设置预算
+        if budget:
+            print("Warning: Invalid MONTHLY_BUDGET format")
+        return None
+    return MappingProxyType(budget)
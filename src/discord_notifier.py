@@ -4,24 +4,48 @@ Discord Webhook 通知器
 import os
 import json
 import requests
-from typing import Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import TYPE_CHECKING, Optional
+
+from .analyzer import cents_to_dollars
+
+if TYPE_CHECKING:
+    from .analyzer import WeeklyStats
 
 
 class DiscordNotifier:
     """发送报告到 Discord"""
 
+    # Discord 限制: content 最长 2000 字符
+    MAX_CONTENT_LENGTH = 2000
+
     def __init__(self, webhook_url: Optional[str] = None):
         self.webhook_url = webhook_url or os.getenv("DISCORD_WEBHOOK_URL")
+        # 最近一次发送失败时请求是否确定未被 Discord 处理 (429 / 连接超时)，调用方据此决定能否安全重发；
+        # 5xx、读超时、连接中断时消息可能已被接受，重发会产生重复消息
+        self.last_error_transient = False
+        self._session = requests.Session()
+        # 429 (未被处理，遵循 Retry-After) 和连接失败在 HTTP 层重试；
+        # 读超时 / 5xx 时消息可能已被接受，不重发 POST，避免重复消息
+        self._session.mount("https://", HTTPAdapter(max_retries=Retry(
+            total=3,
+            read=0,
+            backoff_factor=0.3,
+            status_forcelist=[429],
+            allowed_methods=["POST"]
+        )))
 
     def send_report(self, content: str) -> bool:
         """发送 Markdown 格式的报告"""
+        self.last_error_transient = False
         if not self.webhook_url:
             print("Warning: DISCORD_WEBHOOK_URL not set")
             return False
 
         # Discord 限制: content 最长 2000 字符
-        if len(content) > 2000:
-            content = content[:1997] + "..."
+        if len(content) > self.MAX_CONTENT_LENGTH:
+            content = content[:self.MAX_CONTENT_LENGTH - 3] + "..."
 
         payload = {
             "content": content,
@@ -29,18 +53,28 @@ class DiscordNotifier:
             "avatar_url": "https://cdn-icons-png.flaticon.com/512/3135/3135679.png"
         }
 
+        # 预先编码为 UTF-8 字节：中文不转义为 \uXXXX，payload 体积约减半
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
         try:
-            resp = requests.post(
+            resp = self._session.post(
                 self.webhook_url,
-                json=payload,
+                data=body,
                 timeout=30,
                 headers={"Content-Type": "application/json"}
             )
             resp.raise_for_status()
             return True
+        except requests.HTTPError as e:
+            self.last_error_transient = e.response.status_code == 429
+            print(f"Failed to send Discord notification: {e}")
+        except (requests.ConnectTimeout, requests.exceptions.RetryError) as e:
+            # 连接未建立 / 429 重试耗尽
+            self.last_error_transient = True
+            print(f"Failed to send Discord notification: {e}")
         except Exception as e:
             print(f"Failed to send Discord notification: {e}")
-            return False
+        return False
 
     def send_weekly_report(
         self,
@@ -59,39 +93,56 @@ class DiscordNotifier:
         
         # 金额格式化
         def fmt_cents(cents: int) -> str:
-            return f"${cents/100:.0f}"
+            return f"${cents_to_dollars(cents)}"
 
-        # 构建 Discord 消息
-        lines = [
+        # 构建 Discord 消息：按段追加并累计长度，超出上限后不再拼接后续段落
+        lines = []
+        length = 0
+
+        def push(*section: str) -> bool:
+            nonlocal length
+            size = sum(len(line) + 1 for line in section)
+            if length < 0 or length + size > self.MAX_CONTENT_LENGTH:
+                length = -1  # 已满，后续段落全部跳过
+                return False
+            lines.extend(section)
+            length += size
+            return True
+
+        push(
             "# 📊 本周财务简报 (Fallback)",
             f"**{stats.week_start} ~ {stats.week_end}**\n",
             "## 💰 收支概览",
             f"• 收入: **{fmt_cents(stats.total_income)}**",
             f"• 支出: **{fmt_cents(stats.total_expense)}** (日均 {fmt_cents(stats.daily_average)})",
             f"• 结余: **{fmt_cents(stats.net_change)}**\n",
-        ]
+        )
 
         # Top 5 支出
         if stats.top_expenses:
-            lines.append("## 📈 支出Top5")
-            for i, (cat, amount) in enumerate(stats.top_expenses[:5], 1):
-                lines.append(f"{i}. {cat}: {fmt_cents(amount)}")
-            lines.append("")
+            push(
+                "## 📈 支出Top5",
+                *(f"{i}. {cat}: {fmt_cents(amount)}" for i, (cat, amount) in enumerate(stats.top_expenses[:5], 1)),
+                "",
+            )
 
         # 预算健康度
         if budget_health.get("status"):
             emoji = {"healthy": "✅", "warning": "⚠️", "critical": "🚨", "unknown": "❓"}
             status_emoji = emoji.get(budget_health["status"], "❓")
-            lines.append(f"## {status_emoji} 预算状态")
-            lines.append(f"{budget_health.get('message', 'N/A')}\n")
+            push(
+                f"## {status_emoji} 预算状态",
+                f"{budget_health.get('message', 'N/A')}\n",
+            )
 
         # 异常提醒
         high_anomalies = [a for a in anomalies if a.severity == "high"]
         if high_anomalies:
-            lines.append("## 🚨 需要关注")
-            for a in high_anomalies[:5]:
-                lines.append(f"• {a.description}")
-            lines.append("")
+            push(
+                "## 🚨 需要关注",
+                *(f"• {a.description}" for a in high_anomalies[:5]),
+                "",
+            )
 
         content = "\n".join(lines)
         return self.send_report(content)
@@ -1,21 +1,92 @@
 """
 Gemini Insight Generator - 只处理预聚合后的数据，极低 Token 成本
 """
+import hashlib
 import os
+import time
+from pathlib import Path
+from string import Template
 from typing import List, Dict, Any, Optional
 from google import genai
-from google.genai import types
+from google.genai import errors
 
-from .analyzer import WeeklyStats, Anomaly
+from .analyzer import WeeklyStats, Anomaly, cents_to_dollars
 
 
 class GeminiSummarizer:
     """用 Gemini 生成自然语言摘要，只输入统计数据，不输入原始交易"""
 
-    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+    # 限流 (429) / 服务端错误 (5xx) 时的最大尝试次数，指数退避
+    MAX_ATTEMPTS = 3
+
+    # Prompt 骨架，类加载时解析一次；$$ 为字面量美元符号
+    PROMPT_TEMPLATE = Template("""你是一个专业的财务助手。请根据以下数据，完全按照指定的 Markdown 格式生成周报。不要添加任何开场白或结束语。
+
+数据:
+日期范围: ${week_start} ~ ${week_end}
+收入: $$${income}
+支出: $$${expense}
+日均支出: $$${daily_avg}
+结余: $$${balance}
+
+Top5支出:
+${top_expenses_str}
+
+Top5收入:
+${top_income_str}
+
+预算状态: ${budget_status}
+
+异常/关注事项:
+${attention_str}
+
+本周交易详情 (按金额排序, Top 30):
+${txn_list_str}
+
+要求:
+1. "本周洞察"部分：请根据收支数据、预算状态和交易详情，写一段简短的分析（3-5句话）。计算支出占收入的比例。语气专业但亲切。
+2. 保持格式整洁，使用emoji。
+3. 如果结余为负，请在洞察中委婉提醒。
+4. 参考“交易详情”来提供更具体的分析，例如具体是哪笔交易导致了支出过高。
+
+输出格式模板:
+# 📊 本周财务简报
+**${week_start} ~ ${week_end}**
+
+## 💰 收支概览
+• 收入: **$$${income}**
+• 支出: **$$${expense}** (日均 $$${daily_avg})
+• 结余: **$$${balance}**
+
+## 📈 主要支出 (Top Expenses)
+${top_expenses_str}
+
+## 📥 收入Top5
+${top_income_str}
+
+## ✅ 预算状态
+${budget_status}
+
+## 💡 本周洞察
+[在此处生成分析]
+
+## 🚨 需要关注
+${attention_str}
+""")
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        cache_dir: Optional[str] = None
+    ):
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         self.model = model or os.getenv("GEMINI_MODEL", "gemini-3-flash-preview")
 
+        # 摘要缓存：相同 prompt 直接复用上次结果，重跑时不再重复调用 LLM
+        self._cache: Dict[str, str] = {}
+        self._cache_dir = Path(cache_dir) / "gemini" if cache_dir else None
+
         if self.api_key:
             self.client = genai.Client(api_key=self.api_key)
             print(f"✨ Gemini initialized with model: {self.model}")
@@ -37,16 +108,73 @@ class GeminiSummarizer:
 
         # 构建极简 prompt，只包含聚合数据
         prompt = self._build_prompt(stats, anomalies, budget_health)
-
-        try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt
-            )
-            return response.text.strip()
-        except Exception as e:
-            print(f"Gemini error: {e}")
-            return self._fallback_summary(stats, anomalies)
+        cache_key = self._cache_key(prompt)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        for attempt in range(self.MAX_ATTEMPTS):
+            try:
+                text = self._generate(prompt)
+                self._cache_put(cache_key, text)
+                return text
+            except errors.APIError as e:
+                if self._should_retry(e, attempt):
+                    time.sleep(2 ** attempt)
+                    continue
+                print(f"Gemini error: {e}")
+            except Exception as e:
+                print(f"Gemini error: {e}")
+            break
+
+        return self._fallback_summary(stats, anomalies)
+
+    def _cache_key(self, prompt: str) -> str:
+        """模型 + prompt 的内容哈希"""
+        return hashlib.blake2b(
+            f"{self.model}\n{prompt}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        if key in self._cache:
+            return self._cache[key]
+        if self._cache_dir:
+            try:
+                text = (self._cache_dir / f"{key}.md").read_text(encoding="utf-8")
+            except OSError:
+                return None
+            self._cache[key] = text
+            return text
+        return None
+
+    def _cache_put(self, key: str, text: str):
+        self._cache[key] = text
+        if self._cache_dir:
+            try:
+                self._cache_dir.mkdir(parents=True, exist_ok=True)
+                (self._cache_dir / f"{key}.md").write_text(text, encoding="utf-8")
+            except OSError as e:
+                print(f"Warning: Gemini cache write failed: {e}")
+
+    def _should_retry(self, error: errors.APIError, attempt: int) -> bool:
+        """限流 / 服务端错误且仍有剩余次数时重试"""
+        retryable = error.code == 429 or error.code >= 500
+        if retryable and attempt < self.MAX_ATTEMPTS - 1:
+            print(f"Gemini error {error.code}, retrying...")
+            return True
+        return False
+
+    def _generate(self, prompt: str) -> str:
+        """调用 Gemini 并返回完整文本"""
+        # 流式接收，边到达边拼接，不必等待完整响应对象
+        stream = self.client.models.generate_content_stream(
+            model=self.model,
+            contents=prompt
+        )
+        text = "".join(chunk.text or "" for chunk in stream).strip()
+        if not text:
+            raise ValueError("empty response")
+        return text
 
     def _build_prompt(
         self,
@@ -57,30 +185,28 @@ class GeminiSummarizer:
         """构建结构化 Prompt"""
 
         # 金额转换为美元显示
-        income = stats.total_income / 100
-        expense = stats.total_expense / 100
-        balance = (stats.total_income - stats.total_expense) / 100
-        daily_avg = stats.daily_average / 100
+        income = cents_to_dollars(stats.total_income)
+        expense = cents_to_dollars(stats.total_expense)
+        balance = cents_to_dollars(stats.total_income - stats.total_expense)
+        daily_avg = cents_to_dollars(stats.daily_average)
 
         # 主要支出交易 (Expenses > $20 or Top 5)
-        top_expenses_list = []
-        for i, txn in enumerate(stats.top_transactions, 1):
-            amount = txn['amount']
-            top_expenses_list.append(f"{i}. {txn['payee']}: ${amount:.0f} ({txn['category']})")
-        top_expenses_str = "\n".join(top_expenses_list)
+        top_expenses_str = "\n".join(
+            f"{i}. {txn.payee}: ${cents_to_dollars(txn.amount_cents)} ({txn.category})"
+            for i, txn in enumerate(stats.top_transactions, 1)
+        )
 
         # Top 5 收入交易
-        top_income_list = []
-        for i, txn in enumerate(stats.top_income_transactions[:5], 1):
-            amount = txn['amount']
-            top_income_list.append(f"{i}. {txn['payee']}: ${amount:.0f} ({txn['category']})")
-        top_income_str = "\n".join(top_income_list) if top_income_list else "无收入记录"
+        top_income_str = "\n".join(
+            f"{i}. {txn.payee}: ${cents_to_dollars(txn.amount_cents)} ({txn.category})"
+            for i, txn in enumerate(stats.top_income_transactions[:5], 1)
+        ) or "无收入记录"
 
         # 异常/大额交易提醒
         attention_list = []
         # 添加大额交易
         for txn in stats.large_transactions[:5]: # limit to 5
-            attention_list.append(f"• {txn['date'][5:]}有一笔${txn['amount']:.0f}的{txn['category']}支出 ({txn['payee']})")
+            attention_list.append(f"• {txn['date'][5:]}有一笔${cents_to_dollars(txn['amount_cents'])}的{txn['category']}支出 ({txn['payee']})")
         
         # 添加高优先级异常
         for a in anomalies:
@@ -93,72 +219,25 @@ class GeminiSummarizer:
         budget_status = budget_health.get("message", "预算数据不可用")
 
         # 准备交易详情 (Top 30 by amount)
-        # Sort by absolute amount descending
-        sorted_txns = sorted(
-            stats.simplified_transactions,
-            key=lambda x: abs(x['amount']),
-            reverse=True
-        )[:30]
-
-        txn_list_str = "\n".join([
-            f"- {t['date']} {t['payee']}: ${t['amount']:.2f} ({t['category']}) {t.get('notes') or ''}"
-            for t in sorted_txns
-        ])
-
-        prompt = f"""你是一个专业的财务助手。请根据以下数据，完全按照指定的 Markdown 格式生成周报。不要添加任何开场白或结束语。
-
-数据:
-日期范围: {stats.week_start} ~ {stats.week_end}
-收入: ${income:.0f}
-支出: ${expense:.0f}
-日均支出: ${daily_avg:.0f}
-结余: ${balance:.0f}
-
-Top5支出:
-{top_expenses_str}
-
-Top5收入:
-{top_income_str}
-
-预算状态: {budget_status}
-
-异常/关注事项:
-{attention_str}
-
-本周交易详情 (按金额排序, Top 30):
-{txn_list_str}
-
-要求:
-1. "本周洞察"部分：请根据收支数据、预算状态和交易详情，写一段简短的分析（3-5句话）。计算支出占收入的比例。语气专业但亲切。
-2. 保持格式整洁，使用emoji。
-3. 如果结余为负，请在洞察中委婉提醒。
-4. 参考“交易详情”来提供更具体的分析，例如具体是哪笔交易导致了支出过高。
-
-输出格式模板:
-# 📊 本周财务简报
-**{stats.week_start} ~ {stats.week_end}**
-
-## 💰 收支概览
-• 收入: **${income:.0f}**
-• 支出: **${expense:.0f}** (日均 ${daily_avg:.0f})
-• 结余: **${balance:.0f}**
-
-## 📈 主要支出 (Top Expenses)
-{top_expenses_str}
-
-## 📥 收入Top5
-{top_income_str}
-
-## ✅ 预算状态
-{budget_status}
-
-## 💡 本周洞察
-[在此处生成分析]
-
-## 🚨 需要关注
-{attention_str}
-"""
-        return prompt
+        # 分析器已按金额绝对值降序截取，无需再次排序
+        txn_list_str = "\n".join(
+            f"- {t.date} {t.payee}: ${t.amount:.2f} ({t.category}) {t.notes or ''}"
+            for t in stats.simplified_transactions
+        )
+
+        return self.PROMPT_TEMPLATE.substitute(
+            week_start=stats.week_start,
+            week_end=stats.week_end,
+            income=income,
+            expense=expense,
+            daily_avg=daily_avg,
+            balance=balance,
+            top_expenses_str=top_expenses_str,
+            top_income_str=top_income_str,
+            budget_status=budget_status,
+            attention_str=attention_str,
+            txn_list_str=txn_list_str
+        )
 
     def _fallback_summary(
         self,
@@ -167,11 +246,11 @@ Top5收入:
     ) -> str:
         """Gemini 失败时的回退方案"""
         lines = [
-            f"本周支出 ${stats.total_expense/100:.0f}，",
+            f"本周支出 ${cents_to_dollars(stats.total_expense)}，",
         ]
 
         if stats.total_income > 0:
-            lines.append(f"收入 ${stats.total_income/100:.0f}，")
+            lines.append(f"收入 ${cents_to_dollars(stats.total_income)}，")
 
         if anomalies:
             high_priority = [a for a in anomalies if a.severity == "high"]
@@ -1,23 +1,31 @@
 """
 主程序：预算周报生成器
 """
-import os
+import logging
 import sys
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-from dotenv import load_dotenv
+import time
+from dataclasses import replace
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Optional, Dict, Any
 
-load_dotenv()
+from .analyzer import FinanceAnalyzer
+from .config import Config, ConfigError
 
-from .actual_client import ActualClient
-from .analyzer import FinanceAnalyzer, WeeklyStats
-from .gemini_summarizer import GeminiSummarizer
-from .discord_notifier import DiscordNotifier
+# actualpy / google-genai 导入较慢，推迟到真正用到时再加载
+if TYPE_CHECKING:
+    from .gemini_summarizer import GeminiSummarizer
+    from .discord_notifier import DiscordNotifier
+
+logger = logging.getLogger(__name__)
 
 
 class BudgetReporter:
     """预算周报生成器"""
 
+    # 报告已生成后，发送请求确定未被处理 (限流 / 连接超时) 时的最大尝试次数，指数退避 (秒)，无需重新拉取和分析数据
+    SEND_ATTEMPTS = 3
+    SEND_BACKOFF = 5
+
     def __init__(
         self,
         actual_url: Optional[str] = None,
@@ -25,32 +33,44 @@ class BudgetReporter:
         actual_budget_id: Optional[str] = None,
         gemini_api_key: Optional[str] = None,
         discord_webhook: Optional[str] = None,
+        config: Optional[Config] = None,
     ):
-        # Actual Budget 配置
-        self.actual_url = actual_url or os.getenv("ACTUAL_SERVER_URL")
-        self.actual_password = actual_password or os.getenv("ACTUAL_PASSWORD")
-        self.actual_budget_id = actual_budget_id or os.getenv("ACTUAL_BUDGET_ID")
-
-        # Gemini 配置
-        self.gemini_api_key = gemini_api_key or os.getenv("GOOGLE_GENERATIVE_AI_API_KEY")
-
-        # Discord 配置
-        self.discord_webhook = discord_webhook or os.getenv("DISCORD_WEBHOOK_URL")
+        # 配置只从环境变量解析一次，显式传入的参数优先
+        config = config or Config.from_env()
+        overrides = {
+            "actual_url": actual_url,
+            "actual_password": actual_password,
+            "budget_id": actual_budget_id,
+            "gemini_key": gemini_api_key,
+            "discord_webhook": discord_webhook,
+        }
+        overrides = {k: v for k, v in overrides.items() if v}
+        self.config = replace(config, **overrides) if overrides else config
+        # 缺少 Actual 连接信息时立即失败 (ConfigError)，不做任何后续工作
+        self.config.validate()
+
+        # 下游客户端按需创建并在多次调用间复用，保持其 HTTP 连接池
+        self._summarizer: Optional["GeminiSummarizer"] = None
+        self._notifier: Optional["DiscordNotifier"] = None
+
+    @property
+    def summarizer(self) -> "GeminiSummarizer":
+        if self._summarizer is None:
+            from .gemini_summarizer import GeminiSummarizer
+
+            self._summarizer = GeminiSummarizer(
+                api_key=self.config.gemini_key,
+                cache_dir=self.config.cache_dir
+            )
+        return self._summarizer
 
-        # 月度预算配置（可选，从环境变量读取 JSON）
-        self.monthly_budget = self._load_budget_config()
+    @property
+    def notifier(self) -> "DiscordNotifier":
+        if self._notifier is None:
+            from .discord_notifier import DiscordNotifier
 
-    def _load_budget_config(self) -> Optional[Dict[str, int]]:
-        """加载月度预算配置"""
-        import json
-        budget_str = os.getenv("MONTHLY_BUDGET", "")
-        if budget_str:
-            try:
-                # 格式: {"餐饮": 50000, "交通": 20000} (单位: cents)
-                return json.loads(budget_str)
-            except json.JSONDecodeError:
-                print("Warning: Invalid MONTHLY_BUDGET format")
-        return None
+            self._notifier = DiscordNotifier(self.config.discord_webhook)
+        return self._notifier
 
     def generate_weekly_report(
         self,
@@ -72,60 +92,57 @@ class BudgetReporter:
 
         # 计算本周日期范围 (周日 -> 周六)
         # 如果今天是周日，这周日就是今天
-        days_since_sunday = reference_date.weekday() + 1  # weekday(): Mon=0, Sun=6
-        if days_since_sunday == 7:
-            days_since_sunday = 0
-        week_end = reference_date - timedelta(days=days_since_sunday)
-        week_start = week_end - timedelta(days=6)
-
-        start_str = week_start.strftime("%Y-%m-%d")
-        end_str = week_end.strftime("%Y-%m-%d")
-
-        print(f"Generating report for: {start_str} ~ {end_str}")
-
-        if not self.actual_url or not self.actual_password:
-            print("❌ Error: ACTUAL_SERVER_URL and ACTUAL_PASSWORD are required")
-            return {}
-
-        # 连接 Actual Budget
-        client = ActualClient(
-            server_url=self.actual_url,
-            password=self.actual_password,
-            budget_id=self.actual_budget_id
-        )
+        # weekday(): Mon=0, Sun=6 -> 距周日天数 Mon=1 ... Sat=6, Sun=0
+        days_since_sunday = (reference_date.weekday() + 1) % 7
+        # 用 ordinal 整数做日期运算，最后才转换为 ISO 字符串
+        week_end_ord = reference_date.toordinal() - days_since_sunday
+        week_start_ord = week_end_ord - 6
 
-        if not client.login():
-            raise RuntimeError("Failed to login to Actual Budget")
+        start_str = date.fromordinal(week_start_ord).isoformat()
+        end_str = date.fromordinal(week_end_ord).isoformat()
 
-        # 获取本周交易
-        transactions = client.get_transactions(start_str, end_str)
-        print(f"Found {len(transactions)} transactions this week")
+        # 上周日期范围，在连接服务器前一并算好
+        prev_start_str = date.fromordinal(week_start_ord - 7).isoformat()
 
-        # 分析本周数据
-        analyzer = FinanceAnalyzer(transactions)
-        current_stats = analyzer.calculate_weekly_stats()
+        logger.info("Generating report for: %s ~ %s", start_str, end_str)
 
-        # 获取上周数据用于对比
+        # 对比上周时，把上周和本周合并为一次查询，再按日期拆分
         previous_stats = None
+        fetch_start = prev_start_str if compare_with_previous else start_str
+
+        from .actual_client import ActualClient
+
+        # 连接 Actual Budget，退出 with 时立即释放数据库连接和 HTTP 连接池
+        with ActualClient(
+            server_url=self.config.actual_url,
+            password=self.config.actual_password,
+            budget_id=self.config.budget_id
+        ) as client:
+            all_transactions = client.get_transactions(fetch_start, end_str)
+
         if compare_with_previous:
-            prev_week_start = week_start - timedelta(days=7)
-            prev_week_end = week_end - timedelta(days=7)
-            prev_transactions = client.get_transactions(
-                prev_week_start.strftime("%Y-%m-%d"),
-                prev_week_end.strftime("%Y-%m-%d")
-            )
+            # 合并查询时按日期拆分为本周 / 上周
+            transactions, prev_transactions = [], []
+            for t in all_transactions:
+                (transactions if t.date >= start_str else prev_transactions).append(t)
             previous_stats = FinanceAnalyzer(prev_transactions).calculate_weekly_stats()
+        else:
+            transactions = all_transactions
+        logger.info("Found %d transactions this week", len(transactions))
+
+        # 分析本周数据
+        analyzer = FinanceAnalyzer(transactions)
+        current_stats = analyzer.calculate_weekly_stats()
 
         # 检测异常
         anomalies = analyzer.detect_anomalies(current_stats, previous_stats)
-        print(f"Detected {len(anomalies)} anomalies")
+        logger.info("Detected %d anomalies", len(anomalies))
 
         # 预算健康度
-        budget_health = analyzer.calculate_budget_health(current_stats, self.monthly_budget)
+        budget_health = analyzer.calculate_budget_health(current_stats, self.config.monthly_budget)
 
         # 生成自然语言摘要（仅当有 Gemini key 时）
-        summarizer = GeminiSummarizer(api_key=self.gemini_api_key)
-        summary = summarizer.generate_weekly_summary(
+        summary = self.summarizer.generate_weekly_summary(
             current_stats, anomalies, budget_health
         )
 
@@ -139,16 +156,36 @@ class BudgetReporter:
 
     def send_report(self, report: Dict[str, Any]) -> bool:
         """发送报告到 Discord"""
-        notifier = DiscordNotifier(self.discord_webhook)
-        return notifier.send_weekly_report(
+        return self.notifier.send_weekly_report(
             stats=report["stats"],
             anomalies=report["anomalies"],
             summary=report["summary"],
             budget_health=report["budget_health"]
         )
 
+    def _send_with_retry(self, report: Dict[str, Any]) -> bool:
+        """发送报告，遇到 429 / 连接超时时按指数退避重试，复用已生成的报告"""
+        for attempt in range(self.SEND_ATTEMPTS):
+            if self.send_report(report):
+                return True
+            # 4xx 永久错误重试也不会成功；5xx / 读超时时消息可能已送达，重发会重复
+            if not self.notifier.last_error_transient:
+                break
+            if attempt < self.SEND_ATTEMPTS - 1:
+                delay = self.SEND_BACKOFF * 2 ** attempt
+                logger.warning("Send failed, retrying in %ds...", delay)
+                time.sleep(delay)
+        return False
+
     def run(self) -> bool:
         """运行完整流程：生成 + 发送"""
+        # 没有 webhook 时报告无处发送，生成之前就退出
+        try:
+            self.config.validate(require_webhook=True)
+        except ConfigError as e:
+            logger.error("❌ Error: %s", e)
+            return False
+
         try:
             report = self.generate_weekly_report()
             
@@ -159,18 +196,17 @@ class BudgetReporter:
             print(report.get("summary", "No summary generated"))
             print("="*50 + "\n")
 
-            success = self.send_report(report)
+            success = self._send_with_retry(report)
             if success:
-                print("✅ Weekly report sent successfully")
+                logger.info("✅ Weekly report sent successfully")
             else:
-                print("❌ Failed to send report")
+                logger.error("❌ Failed to send report")
             return success
         except Exception as e:
-            print(f"❌ Error: {e}")
+            logger.error("❌ Error: %s", e)
             # 尝试发送错误通知
             try:
-                notifier = DiscordNotifier(self.discord_webhook)
-                notifier.send_report(f"❌ 预算报告生成失败: {str(e)}")
+                self.notifier.send_report(f"❌ 预算报告生成失败: {str(e)}")
             except:
                 pass
             return False
@@ -178,7 +214,12 @@ class BudgetReporter:
 
 def main():
     """CLI 入口"""
-    reporter = BudgetReporter()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        reporter = BudgetReporter()
+    except ConfigError as e:
+        logger.error("❌ Error: %s", e)
+        sys.exit(1)
     success = reporter.run()
     sys.exit(0 if success else 1)
 
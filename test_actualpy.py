@@ -33,9 +33,8 @@ def main():
             session = actual.session 
             txns = session.query(Transactions).limit(5).all()
             print(f"✅ Found {len(txns)} transactions (showing first 5):")
-            for t in txns:
-                # Transactions model might store amount in cents or int
-                print(f"  - {t.date} {t.payee}: {t.amount}")
+            # Transactions model might store amount in cents or int
+            sys.stdout.write("".join(f"  - {t.date} {t.payee}: {t.amount}\n" for t in txns))
                 
     except Exception as e:
         print(f"❌ Error: {e}")